@@ -68,7 +68,7 @@ function App() {
 
   const fetchNodeStatuses = async () => {
     const statuses = {};
-    for (const node of NODES) {
+    await Promise.all(NODES.map(async (node) => {
       try {
         const response = await fetch(`http://localhost:${node.port}/status`);
         const data = await response.json();
@@ -76,7 +76,7 @@ function App() {
       } catch (error) {
         statuses[node.id] = { status: 'unhealthy', error: error.message };
       }
-    }
+    }));
     setNodeStatuses(statuses);
   };
 
@@ -69,8 +69,7 @@ function KeyValueForm({ selectedNode, onOperationComplete }) {
 
       // If operation was successful and it was a PUT or DELETE, refresh the stats
       if (response.ok && (action === 'put' || action === 'delete')) {
-        // Wait a short moment for replication
-        await new Promise(resolve => setTimeout(resolve, 500));
+        // Replicas have acknowledged by the time the node responds
         onOperationComplete();
         
         // Clear form after successful PUT
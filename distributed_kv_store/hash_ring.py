@@ -0,0 +1,67 @@
+import bisect
+import hashlib
+import zlib
+from typing import Dict, Iterator, List, Set
+
+class HashRing:
+    def __init__(self, replicas: int = 100):
+        self.replicas = replicas
+        self.ring: Dict[int, str] = {}
+        self.sorted_keys: List[int] = []
+        self._node_hashes: Dict[str, List[int]] = {}
+        self._members: Set[str] = set()
+
+    def get_hash(self, key: str) -> int:
+        """Hash a key to its position on the ring."""
+        return zlib.crc32(key.encode())
+
+    def _virtual_node_hashes(self, node_id: str) -> List[int]:
+        """Positions of a node's virtual points, computed once per node.
+
+        Virtual node names only differ in their last few characters, which
+        CRC32 spreads poorly, so points are placed with blake2b instead.
+        """
+        hashes = self._node_hashes.get(node_id)
+        if hashes is None:
+            prefix = node_id.encode() + b":"
+            blake2b = hashlib.blake2b
+            hashes = [
+                int.from_bytes(blake2b(prefix + str(i).encode(), digest_size=4).digest(), "big")
+                for i in range(self.replicas)
+            ]
+            self._node_hashes[node_id] = hashes
+        return hashes
+
+    def add_node(self, node_id: str) -> None:
+        """Place a node's virtual points on the ring."""
+        self._members.add(node_id)
+        for hash_key in self._virtual_node_hashes(node_id):
+            if hash_key in self.ring:
+                continue
+            self.ring[hash_key] = node_id
+            bisect.insort(self.sorted_keys, hash_key)
+
+    def remove_node(self, node_id: str) -> None:
+        """Remove all of a node's virtual points from the ring."""
+        self._members.discard(node_id)
+        removed = set()
+        for hash_key in self._virtual_node_hashes(node_id):
+            if self.ring.get(hash_key) == node_id:
+                del self.ring[hash_key]
+                removed.add(hash_key)
+        if removed:
+            self.sorted_keys = [k for k in self.sorted_keys if k not in removed]
+
+    def iter_nodes(self, key: str) -> Iterator[str]:
+        """Yield distinct node ids clockwise from a key's position."""
+        if not self.sorted_keys:
+            return
+        start = bisect.bisect(self.sorted_keys, self.get_hash(key))
+        seen = set()
+        for i in range(len(self.sorted_keys)):
+            node_id = self.ring[self.sorted_keys[(start + i) % len(self.sorted_keys)]]
+            if node_id not in seen:
+                seen.add(node_id)
+                yield node_id
+                if len(seen) == len(self._members):
+                    return
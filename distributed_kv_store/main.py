@@ -1,15 +1,20 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import os
 import sys
+import time
 import logging
+from datetime import datetime, timedelta
 from fastapi.responses import JSONResponse
 
 from storage import storage
-from node_manager import NodeManager
+from node_manager import NodeManager, PEER_KEEPALIVE_TIMEOUT
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,6 +22,14 @@ logger = logging.getLogger(__name__)
 class KeyValue(BaseModel):
     value: Any
 
+class ReplicationEntry(BaseModel):
+    op: Literal["put", "delete"]
+    key: str
+    value: Any = None
+
+class ReplicationBatch(BaseModel):
+    entries: List[ReplicationEntry]
+
 class NodeStatus(BaseModel):
     node_id: str
     status: str
@@ -25,7 +38,12 @@ class NodeStatus(BaseModel):
     host: str
     port: int
 
-app = FastAPI(title="Distributed Key-Value Store")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await node_manager.close()
+
+app = FastAPI(title="Distributed Key-Value Store", lifespan=lifespan)
 
 # Enable CORS with more specific settings
 app.add_middleware(
@@ -36,6 +54,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses (e.g. /keys) only; small ones aren't worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Initialize node manager
 node_id = os.environ.get("NODE_ID", "node_1")
 try:
@@ -56,8 +77,8 @@ async def global_exception_handler(request, exc):
 async def get_value(key: str):
     try:
         # Determine which node should handle this key
-        target_node = node_manager.get_node_for_key(key)
-        logger.info(f"Get request for key '{key}' routed to node {target_node.id}")
+        target_node, *replicas = node_manager.get_nodes_for_key(key)
+        logger.debug("Get request for key '%s' routed to node %s", key, target_node.id)
         
         # If this is the target node, handle locally
         if target_node.id == node_id:
@@ -70,10 +91,14 @@ async def get_value(key: str):
         response = await node_manager.forward_request(target_node, "GET", f"/store/{key}")
         if response is None:
             # Try replicas if primary node fails
-            replicas = node_manager.get_replica_nodes(target_node)
-            logger.info(f"Primary node failed, trying {len(replicas)} replicas")
+            logger.info("Primary node failed, trying %d replicas", len(replicas))
             for replica in replicas:
-                response = await node_manager.forward_request(replica, "GET", f"/store/{key}")
+                if replica.id == node_id:
+                    value = storage.get(key)
+                    if value is not None:
+                        return {"key": key, "value": value}
+                    continue
+                response = await node_manager.forward_request(replica, "GET", f"/replica/{key}")
                 if response is not None:
                     return response
             raise HTTPException(status_code=404, detail="Key not found")
@@ -82,35 +107,47 @@ async def get_value(key: str):
         logger.error(f"Error in get_value: {e}")
         raise
 
+@app.get("/replica/{key}")
+async def get_replica_value(key: str):
+    # Replica reads are served from local storage only; routing them
+    # through /store would forward them back to the failed primary.
+    try:
+        value = storage.get(key)
+        if value is None:
+            raise HTTPException(status_code=404, detail="Key not found")
+        return {"key": key, "value": value}
+    except Exception as e:
+        logger.error(f"Error in get_replica_value: {e}")
+        raise
+
 @app.put("/store/{key}")
 async def put_value(key: str, item: KeyValue):
     try:
         # Determine which node should handle this key
-        target_node = node_manager.get_node_for_key(key)
-        logger.info(f"Put request for key '{key}' routed to node {target_node.id}")
+        target_node, *replicas = node_manager.get_nodes_for_key(key)
+        logger.debug("Put request for key '%s' routed to node %s", key, target_node.id)
         
-        # Store on primary node
-        if target_node.id == node_id:
-            storage.put(key, item.value)
-            logger.info(f"Stored key '{key}' locally")
-        else:
+        # Forward to the primary node, which replicates the write itself
+        if target_node.id != node_id:
             response = await node_manager.forward_request(
                 target_node, "PUT", f"/store/{key}", 
                 json={"value": item.value}
             )
             if response is None:
                 raise HTTPException(status_code=503, detail="Failed to store value")
+            return response
+        
+        storage.put(key, item.value)
+        logger.debug("Stored key '%s' locally", key)
         
         # Replicate to backup nodes
-        replicas = node_manager.get_replica_nodes(target_node)
-        logger.info(f"Replicating to {len(replicas)} nodes")
-        for replica in replicas:
-            await node_manager.forward_request(
-                replica, "PUT", f"/store/{key}",
-                json={"value": item.value}
-            )
+        logger.debug("Replicating to %d nodes", len(replicas))
+        results = await asyncio.gather(*(
+            node_manager.replicate(replica, {"op": "put", "key": key, "value": item.value})
+            for replica in replicas
+        ), return_exceptions=True)
         
-        return {"status": "success", "node": target_node.id}
+        return {"status": "success", "node": target_node.id, "replicas": results.count(True)}
     except Exception as e:
         logger.error(f"Error in put_value: {e}")
         raise
@@ -118,28 +155,49 @@ async def put_value(key: str, item: KeyValue):
 @app.delete("/store/{key}")
 async def delete_value(key: str):
     try:
-        target_node = node_manager.get_node_for_key(key)
-        logger.info(f"Delete request for key '{key}' routed to node {target_node.id}")
+        target_node, *replicas = node_manager.get_nodes_for_key(key)
+        logger.debug("Delete request for key '%s' routed to node %s", key, target_node.id)
         
-        if target_node.id == node_id:
-            if not storage.delete(key):
-                raise HTTPException(status_code=404, detail="Key not found")
-        else:
+        # Forward to the primary node, which deletes from replicas itself
+        if target_node.id != node_id:
             response = await node_manager.forward_request(target_node, "DELETE", f"/store/{key}")
             if response is None:
                 raise HTTPException(status_code=404, detail="Key not found")
+            return response
+        
+        if not storage.delete(key):
+            raise HTTPException(status_code=404, detail="Key not found")
         
         # Delete from replicas
-        replicas = node_manager.get_replica_nodes(target_node)
-        logger.info(f"Deleting from {len(replicas)} replicas")
-        for replica in replicas:
-            await node_manager.forward_request(replica, "DELETE", f"/store/{key}")
+        logger.debug("Deleting from %d replicas", len(replicas))
+        results = await asyncio.gather(*(
+            node_manager.replicate(replica, {"op": "delete", "key": key})
+            for replica in replicas
+        ), return_exceptions=True)
         
-        return {"status": "success", "node": target_node.id}
+        return {"status": "success", "node": target_node.id, "replicas": results.count(True)}
     except Exception as e:
         logger.error(f"Error in delete_value: {e}")
         raise
 
+@app.post("/replicate")
+async def replicate(batch: ReplicationBatch):
+    # Replicated writes are applied locally as-is; routing them through
+    # /store would forward them back to the primary.
+    try:
+        applied = 0
+        for entry in batch.entries:
+            if entry.op == "put":
+                storage.put(entry.key, entry.value)
+                applied += 1
+            elif entry.op == "delete":
+                storage.delete(entry.key)
+                applied += 1
+        return {"status": "success", "applied": applied}
+    except Exception as e:
+        logger.error(f"Error in replicate: {e}")
+        raise
+
 @app.get("/status")
 async def get_status():
     try:
@@ -167,12 +225,14 @@ async def get_keys():
 @app.get("/node-info")
 async def get_node_info():
     try:
+        # Heartbeats are tracked on the monotonic clock; convert to wall-clock time for reporting
+        now = time.monotonic()
         return {
             "nodes": [
                 {
                     "id": node.id,
                     "url": node.url,
-                    "last_heartbeat": node.last_heartbeat.isoformat(),
+                    "last_heartbeat": (datetime.now() - timedelta(seconds=now - node.last_heartbeat)).isoformat(),
                     "is_healthy": node.is_healthy,
                     "failed_attempts": node.failed_attempts
                 }
@@ -188,4 +248,9 @@ if __name__ == "__main__":
         node_id = sys.argv[1]
     port = node_manager.nodes[node_id].port
     logger.info(f"Starting node {node_id} on port {port}")
-    uvicorn.run(app, host="127.0.0.1", port=port) 
\ No newline at end of file
+    uvicorn.run(
+        app,
+        host="127.0.0.1",
+        port=port,
+        timeout_keep_alive=PEER_KEEPALIVE_TIMEOUT + 15
+    ) 
\ No newline at end of file
@@ -1,33 +1,51 @@
 import json
-import hashlib
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import aiohttp
 import asyncio
-from datetime import datetime
+import itertools
+import time
 import logging
 
+from hash_ring import HashRing
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Idle peer connections are kept this long (seconds). Must stay below the
+# server keep-alive timeout so a pooled connection is never reused just as
+# the peer closes it.
+PEER_KEEPALIVE_TIMEOUT = 60
+
+# Most replication entries sent to one node in a single /replicate request.
+REPLICATION_BATCH_SIZE = 64
+
 class Node:
-    def __init__(self, id: str, host: str, port: int):
+    def __init__(self, id: str, host: str, port: int,
+                 on_health_change: Optional[Callable[["Node"], None]] = None):
         self.id = id
         self.host = host
         self.port = port
         self.url = f"http://{host}:{port}"
-        self.last_heartbeat = datetime.now()
+        self.last_heartbeat = time.monotonic()
         self.failed_attempts = 0
         self.max_failures = 3
+        self.on_health_change = on_health_change
 
     def mark_failed(self):
+        was_healthy = self.is_healthy
         self.failed_attempts += 1
         logger.warning(f"Node {self.id} failed attempt {self.failed_attempts}")
+        if was_healthy and not self.is_healthy and self.on_health_change:
+            self.on_health_change(self)
 
     def mark_healthy(self):
+        was_healthy = self.is_healthy
         if self.failed_attempts > 0:
             logger.info(f"Node {self.id} recovered")
         self.failed_attempts = 0
-        self.last_heartbeat = datetime.now()
+        self.last_heartbeat = time.monotonic()
+        if not was_healthy and self.on_health_change:
+            self.on_health_change(self)
 
     @property
     def is_healthy(self):
@@ -38,6 +56,10 @@ class NodeManager:
         self.config_path = config_path
         self.current_node_id = current_node_id
         self.nodes: Dict[str, Node] = {}
+        self.ring = HashRing()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._replication_queues: Dict[str, List[Tuple[dict, asyncio.Future]]] = {}
+        self._replication_tasks: Dict[str, asyncio.Task] = {}
         self.load_config()
         
     def load_config(self) -> None:
@@ -49,33 +71,57 @@ class NodeManager:
                     node = Node(
                         id=node_config["id"],
                         host=node_config["host"],
-                        port=node_config["port"]
+                        port=node_config["port"],
+                        on_health_change=self._on_health_change
                     )
                     self.nodes[node.id] = node
+                    self.ring.add_node(node.id)
             self.replication_factor = config.get("replication_factor", 1)
         except Exception as e:
             logger.error(f"Failed to load config: {e}")
             raise
+
+    def _on_health_change(self, node: Node) -> None:
+        """Keep the ring in sync with node health."""
+        if node.is_healthy:
+            self.ring.add_node(node.id)
+        else:
+            self.ring.remove_node(node.id)
         
-    def get_node_for_key(self, key: str) -> Node:
-        """Determine which node should handle a given key."""
-        hash_value = int(hashlib.md5(key.encode()).hexdigest(), 16)
-        healthy_nodes = [n for n in self.nodes.values() if n.is_healthy]
-        if not healthy_nodes:
+    def get_nodes_for_key(self, key: str) -> List[Node]:
+        """Get the primary followed by the replica nodes for a key.
+
+        Replicas are the next distinct healthy nodes clockwise on the ring,
+        so each key's copies follow its own position rather than its primary.
+        """
+        node_ids = list(itertools.islice(self.ring.iter_nodes(key), self.replication_factor))
+        if not node_ids:
             raise Exception("No healthy nodes available")
-        node_index = hash_value % len(healthy_nodes)
-        return healthy_nodes[node_index]
-        
-    def get_replica_nodes(self, primary_node: Node) -> List[Node]:
-        """Get replica nodes for a given primary node."""
-        healthy_nodes = [n for n in self.nodes.values() if n.is_healthy and n.id != primary_node.id]
-        replicas = []
-        
-        for i in range(min(self.replication_factor - 1, len(healthy_nodes))):
-            replicas.append(healthy_nodes[i])
-            
-        return replicas
+        return [self.nodes[node_id] for node_id in node_ids]
         
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared client session, creating it on first use.
+
+        The session must be created inside the running event loop, so it is
+        built lazily rather than in __init__.
+        """
+        if self._session is None or self._session.closed:
+            timeout = aiohttp.ClientTimeout(total=5)  # 5 seconds timeout
+            connector = aiohttp.TCPConnector(
+                limit=0,
+                limit_per_host=64,
+                ttl_dns_cache=300,
+                keepalive_timeout=PEER_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared client session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
     async def forward_request(self, node: Node, method: str, path: str, **kwargs) -> Optional[dict]:
         """Forward a request to another node with retry logic."""
         max_retries = 2
@@ -83,19 +129,18 @@ class NodeManager:
         
         for attempt in range(max_retries + 1):
             if not node.is_healthy:
-                logger.warning(f"Node {node.id} is unhealthy, skipping request")
+                logger.warning("Node %s is unhealthy, skipping request", node.id)
                 return None
                 
             try:
-                timeout = aiohttp.ClientTimeout(total=5)  # 5 seconds timeout
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.request(method, f"{node.url}{path}", **kwargs) as response:
-                        if response.status == 404:
-                            return None
-                        if response.status >= 500:
-                            raise aiohttp.ClientError(f"Server error: {response.status}")
-                        node.mark_healthy()
-                        return await response.json()
+                session = self._get_session()
+                async with session.request(method, f"{node.url}{path}", **kwargs) as response:
+                    if response.status == 404:
+                        return None
+                    if response.status >= 500:
+                        raise aiohttp.ClientError(f"Server error: {response.status}")
+                    node.mark_healthy()
+                    return await response.json()
                         
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 node.mark_failed()
@@ -105,6 +150,60 @@ class NodeManager:
                     continue
                 return None
                 
+    async def replicate(self, node: Node, entry: dict) -> bool:
+        """Replicate a write entry to a node, batched with concurrent writes.
+
+        Entries queued while a batch to the same node is in flight are sent
+        together in the next /replicate request, so concurrent writes share
+        one round-trip. Returns whether the batch was acknowledged.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._replication_queues.setdefault(node.id, []).append((entry, future))
+        task = self._replication_tasks.get(node.id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._flush_replication(node))
+            self._replication_tasks[node.id] = task
+            task.add_done_callback(lambda t: self._on_flush_done(node.id, t))
+        return await future
+
+    def _on_flush_done(self, node_id: str, task: asyncio.Task) -> None:
+        """Forget a finished flusher, failing any entries it left unsent."""
+        if self._replication_tasks.get(node_id) is not task:
+            return
+        del self._replication_tasks[node_id]
+        if task.cancelled():
+            for _, future in self._replication_queues.pop(node_id, []):
+                if not future.done():
+                    future.set_result(False)
+
+    async def _flush_replication(self, node: Node) -> None:
+        """Send queued replication entries to a node until its queue is empty."""
+        queue = self._replication_queues.get(node.id)
+        while queue:
+            batch = queue[:REPLICATION_BATCH_SIZE]
+            del queue[:REPLICATION_BATCH_SIZE]
+            try:
+                response = await self.forward_request(
+                    node, "POST", "/replicate",
+                    json={"entries": [entry for entry, _ in batch]}
+                )
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(False)
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            # Any reply below 500 comes back as a body (a 422 included), so
+            # only count the batch once the replica reports applying all of it.
+            acked = response is not None and response.get("applied") == len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(acked)
+
     def get_all_nodes(self) -> List[Node]:
         """Get all registered nodes."""
         return list(self.nodes.values())
@@ -1,45 +1,39 @@
 from typing import Dict, Optional, Any
-from datetime import datetime
-import threading
+import time
+
+_MISSING = object()
 
 class Storage:
+    # Every operation below is a single dict call, which CPython executes
+    # atomically under the GIL, so no lock is taken. A free-threaded build
+    # would need locking (e.g. striped locks) around the store again.
     def __init__(self):
         self._store: Dict[str, Any] = {}
-        self._lock = threading.Lock()
-        self._start_time = datetime.now()
+        self._start_time = time.monotonic()
         
     def put(self, key: str, value: Any) -> None:
         """Store a key-value pair."""
-        with self._lock:
-            self._store[key] = value
+        self._store[key] = value
             
     def get(self, key: str) -> Optional[Any]:
         """Retrieve a value by key."""
-        with self._lock:
-            return self._store.get(key)
+        return self._store.get(key)
             
     def delete(self, key: str) -> bool:
         """Delete a key-value pair."""
-        with self._lock:
-            if key in self._store:
-                del self._store[key]
-                return True
-            return False
+        return self._store.pop(key, _MISSING) is not _MISSING
             
     def get_all_keys(self) -> list[str]:
         """Get all stored keys."""
-        with self._lock:
-            return list(self._store.keys())
+        return list(self._store)
             
     def get_key_count(self) -> int:
         """Get the total number of stored keys."""
-        with self._lock:
-            return len(self._store)
+        return len(self._store)
             
     def get_uptime(self) -> str:
         """Get the storage uptime in seconds."""
-        uptime = datetime.now() - self._start_time
-        return f"{int(uptime.total_seconds())}s"
+        return f"{int(time.monotonic() - self._start_time)}s"
 
 # Global storage instance
 storage = Storage() 
\ No newline at end of file